@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import os
+import asyncio
+import logging
+import functools
+import argparse
+import time
+import sys
+import stat
+import io
+from contextlib import AsyncExitStack
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, List, Optional
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+
+# pydantic_ai is slow to import, so it's imported inside the functions that
+# need it; argument and API key errors then fail fast without paying for it
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelResponse
+
+# Ensure logs directory exists
+log_dir = Path("logs")
+log_dir.mkdir(exist_ok=True)
+
+# Environment for the MCP server, built once with the log directory passed through
+_BASE_ENV = {**os.environ, "LOG_DIR": str(log_dir)}
+
+logger = logging.getLogger("agent_structured_test")
+
+# Load environment variables
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+
+# Default model per provider; debug runs use simpler/faster models for testing
+DEFAULT_MODELS = {"openrouter": "anthropic/claude-3-sonnet", "openai": "gpt-4o"}
+DEBUG_MODELS = {"openrouter": "anthropic/claude-3-haiku", "openai": "gpt-3.5-turbo"}
+
+def setup_logging(debug: bool = False):
+    """Configure logging; debug logs the script's own steps, AGENT_DEBUG enables full DEBUG output"""
+    if os.getenv("AGENT_DEBUG"):
+        level = logging.DEBUG
+    elif debug:
+        level = logging.INFO
+    else:
+        level = logging.WARNING
+
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler(log_dir / "agent_structured_test.log"),
+            logging.StreamHandler()
+        ]
+    )
+    logging.getLogger('pydantic_ai').setLevel(level)
+    logging.getLogger('asyncio').setLevel(level)
+
+    # Log script startup
+    logger.info("=== Agent Structured Test Script Starting ===")
+    logger.info(f"Python version: {sys.version}")
+    logger.info(f"OPENAI_API_KEY set: {'Yes' if OPENAI_API_KEY else 'No'}")
+    logger.info(f"OPENROUTER_API_KEY set: {'Yes' if OPENROUTER_API_KEY else 'No'}")
+
+# Define structured output types
+class FileInfo(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
+    name: str
+    path: str
+    size: int
+    is_directory: bool
+    description: Optional[str] = None
+
+class DirectoryContent(BaseModel):
+    directory_path: str
+    files: List[FileInfo]
+    total_files: int
+    total_size: int
+    summary: str
+
+# Build the DirectoryContent validator once so partial validation during
+# streaming doesn't rebuild it for every chunk
+_DC_ADAPTER = TypeAdapter(DirectoryContent)
+
+# Name pydantic-ai gives the output tool for a structured output_type; calls to
+# the MCP tools in the same response must not be validated as DirectoryContent
+OUTPUT_TOOL_NAME = "final_result"
+
+def validate_message(message: ModelResponse, allow_partial: bool = True) -> Optional[DirectoryContent]:
+    """Validate the structured output in a streamed message, which may be incomplete if allow_partial"""
+    from pydantic_ai.messages import ToolCallPart
+
+    for part in message.parts:
+        if isinstance(part, ToolCallPart) and part.tool_name == OUTPUT_TOOL_NAME:
+            # Streamed args are usually raw JSON text; parse and validate in one pass
+            if isinstance(part.args, str):
+                return _DC_ADAPTER.validate_json(
+                    part.args,
+                    experimental_allow_partial='trailing-strings' if allow_partial else False
+                )
+            return _DC_ADAPTER.validate_python(part.args, experimental_allow_partial=allow_partial)
+    return None
+
+# Partial validation is only needed for the progress display, so run it on
+# every Nth streamed chunk (or once the interval has elapsed) rather than all
+VALIDATE_EVERY = 8
+VALIDATE_INTERVAL = 0.1  # seconds
+
+# Minimum time between progress line updates on stdout
+PROGRESS_INTERVAL = 0.1  # seconds
+
+# Startup and response timeouts, applied only to debug runs (the fixed script);
+# the plain script waits as long as the MCP server and model take
+STARTUP_TIMEOUT = 30  # seconds
+RESPONSE_TIMEOUT = 60  # seconds
+
+# Setup agent system prompt
+_PROMPT_TEMPLATE = """
+    # Filesystem Analysis Agent
+
+    You are a specialized agent that analyzes filesystem content and returns structured information.
+    Current time: {time_now}
+
+    ## Capabilities
+    - You can list and analyze directories
+    - You can read file contents
+    - You can provide structured information about filesystem contents
+
+    ## Output Format
+    When asked to analyze a directory, you will return structured information using the DirectoryContent format,
+    which includes:
+    - directory_path: The full path of the directory
+    - files: A list of FileInfo objects with information about each file
+    - total_files: The total number of files found
+    - total_size: The total size of all files in bytes
+    - summary: A brief summary of the directory contents
+
+    ## Instructions
+    - When asked to analyze or summarize a directory, use the appropriate tools to gather information
+    - Provide a complete inventory of files with accurate details
+    - Include helpful descriptions for each file based on its name, extension, or content
+    - Format sizes in a human-readable way when displaying information
+    - Always return properly structured data that matches the output schema
+    """
+
+def load_agent_prompt() -> str:
+    """Create a system prompt for the filesystem agent with structured output"""
+    time_now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    prompt = _PROMPT_TEMPLATE.format(time_now=time_now)
+    logger.info("Agent prompt loaded")
+    return prompt
+
+# Set up model and provider
+def create_model(model_name: Optional[str] = None, debug: bool = False):
+    """Create the model with the appropriate provider"""
+    from pydantic_ai.models.openai import OpenAIModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    defaults = DEBUG_MODELS if debug else DEFAULT_MODELS
+    try:
+        if OPENROUTER_API_KEY:
+            logger.info("Creating model with OpenRouter provider")
+            provider = OpenAIProvider(
+                base_url='https://openrouter.ai/api/v1',
+                api_key=OPENROUTER_API_KEY
+            )
+            logger.info("OpenRouter provider created")
+            model_name = model_name or defaults["openrouter"]
+        else:
+            logger.info("Creating model with OpenAI provider")
+            provider = OpenAIProvider(api_key=OPENAI_API_KEY)
+            logger.info("OpenAI provider created")
+            model_name = model_name or defaults["openai"]
+
+        logger.info(f"Creating model with name: {model_name}")
+        model = OpenAIModel(model_name, provider=provider)
+        logger.info("Model created successfully")
+        return model
+    except Exception as e:
+        logger.error(f"Error creating model: {str(e)}")
+        raise
+
+# Create the agent
+def create_agent(model_name: Optional[str] = None, debug: bool = False):
+    """Create the agent with the filesystem MCP server and structured output type"""
+    from pydantic_ai import Agent
+    from pydantic_ai.mcp import MCPServerStdio
+
+    try:
+        logger.info("Creating agent...")
+        model = create_model(model_name, debug)
+
+        # Get the absolute path to the MCP server script
+        script_dir = Path(__file__).parent.absolute()
+        mcp_server_path = script_dir / "mcp_servers" / "filesystem_mcp.py"  # Use the new implementation
+        logger.info(f"MCP server path: {mcp_server_path}")
+
+        # Ensure the MCP server script exists
+        if not mcp_server_path.exists():
+            logger.error(f"MCP server script not found at: {mcp_server_path}")
+            raise FileNotFoundError(f"MCP server script not found at: {mcp_server_path}")
+
+        # Ensure the MCP server script is executable
+        if not os.access(mcp_server_path, os.X_OK):
+            logger.info(f"Making MCP server script executable: {mcp_server_path}")
+            os.chmod(mcp_server_path, 0o755)
+
+        # Create the MCP server
+        logger.info("Creating MCP server...")
+        mcp_server = MCPServerStdio('python', [str(mcp_server_path)], env=_BASE_ENV)
+        logger.info("MCP server created")
+
+        # Create the agent with DirectoryContent as the output type
+        agent_prompt = load_agent_prompt()
+        logger.info("Creating agent with MCP server and prompt...")
+        agent = Agent(
+            model,
+            mcp_servers=[mcp_server],
+            system_prompt=agent_prompt,
+            output_type=DirectoryContent
+        )
+        logger.info("Agent created successfully")
+
+        return agent
+    except Exception as e:
+        logger.error(f"Error creating agent: {str(e)}")
+        raise
+
+@functools.cache
+def get_agent(model_name: Optional[str] = None, debug: bool = False) -> Agent:
+    """Return the process-wide agent, creating it and its MCP server on first use"""
+    return create_agent(model_name, debug)
+
+def build_analysis_prompt(path: str, st: os.stat_result) -> str:
+    """Build the analysis prompt, seeded with what a local stat already tells us"""
+    is_dir = stat.S_ISDIR(st.st_mode)
+    return (
+        f"Directory '{path}' (size={st.st_size}, is_dir={is_dir}). "
+        f"Analyze the directory '{path}' and provide a structured summary of its contents."
+    )
+
+# (divisor, suffix) per power of 1024, indexed by bit_length
+_SIZE_UNITS = [(1, "bytes"), (1024, "KB"), (1024 ** 2, "MB"), (1024 ** 3, "GB")]
+
+def format_size(size_bytes):
+    """Format size in bytes to a human-readable string"""
+    i = max(0, min(3, (size_bytes.bit_length() - 1) // 10))
+    if not i:
+        return f"{size_bytes} bytes"
+    divisor, suffix = _SIZE_UNITS[i]
+    return f"{size_bytes / divisor:.1f} {suffix}"
+
+# Row layout for the file table, parsed once and reused for every row
+_ROW_FMT = "{name:<30} {type:<10} {size:<12} {desc}\n".format_map
+
+def display_directory_content(content: DirectoryContent):
+    """Display directory content in a nicely formatted way"""
+    # Build the whole report in one buffer and write it out in a single call
+    buf = io.StringIO()
+    buf.write(f"\n===== Directory Analysis: {content.directory_path} =====\n\n")
+    buf.write(f"Summary: {content.summary}\n\n")
+    buf.write(f"Total Files: {content.total_files}\n")
+    buf.write(f"Total Size: {format_size(content.total_size)}\n\n")
+
+    buf.write("Files:\n")
+    buf.write("-" * 80 + "\n")
+    buf.write(_ROW_FMT({"name": "Name", "type": "Type", "size": "Size", "desc": "Description"}))
+    buf.write("-" * 80 + "\n")
+
+    for file in content.files:
+        buf.write(_ROW_FMT({
+            "name": file.name,
+            "type": "Directory" if file.is_directory else "File",
+            "size": "" if file.is_directory else format_size(file.size),
+            "desc": file.description or "",
+        }))
+    sys.stdout.write(buf.getvalue())
+
+async def main(debug: bool = False, model: Optional[str] = None):
+    """Run the filesystem agent with structured streaming"""
+    setup_logging(debug)
+    try:
+        logger.info("Starting main function")
+        agent = get_agent(model, debug)
+
+        print("\nFilesystem Analysis Agent (Structured Streaming)")
+        print("==============================================\n")
+        print("This agent returns structured information about directories.")
+        print("Type a directory path to analyze, or 'exit' to quit.\n")
+
+        # Add timeout for starting MCP servers
+        logger.info("Starting MCP servers...")
+        async with AsyncExitStack() as stack:
+            try:
+                # Only entering the MCP server context is bounded; the REPL below runs without it
+                async with asyncio.timeout(STARTUP_TIMEOUT if debug else None):
+                    await stack.enter_async_context(agent.run_mcp_servers())
+            except asyncio.TimeoutError:
+                print("\nError: Timed out while starting MCP servers. Please check the logs and try again.")
+                logger.error("Timeout while starting MCP servers")
+                return
+            logger.info("MCP servers started successfully")
+
+            while True:
+                # Get user input without blocking the event loop
+                user_input = await asyncio.to_thread(input, "> ")
+                logger.info(f"User input: {user_input}")
+
+                if user_input.lower() == 'exit':
+                    logger.info("User requested exit")
+                    break
+
+                # Process the input to ensure it's asking for directory analysis
+                try:
+                    st = os.stat(user_input)
+                except OSError:
+                    print(f"\nError: Path '{user_input}' does not exist.")
+                    logger.warning(f"Path does not exist: {user_input}")
+                    continue
+
+                # Formulate a clear prompt for directory analysis
+                prompt = build_analysis_prompt(user_input, st)
+                logger.info(f"Formatted prompt: {prompt}")
+
+                # Run the agent with structured streaming
+                try:
+                    print("\nAnalyzing directory, please wait...\n")
+                    logger.info("Starting agent.run_stream for structured data...")
+
+                    # Use structured streaming with timeout
+                    async with asyncio.timeout(RESPONSE_TIMEOUT if debug else None):
+                        async with agent.run_stream(prompt) as result_stream:
+                            logger.info("Agent run_stream started for structured data")
+
+                            # Display partial validations as they come in
+                            print("Streaming partial results:\n")
+                            progress_count = 0
+
+                            # Stream structured results
+                            last_validate = time.monotonic()
+                            last_print = 0.0
+                            last_progress = 0.0
+                            final = None
+                            async for message, is_last in result_stream.stream_structured():
+                                # The last message is complete, so validate it fully once and use it as the result
+                                if is_last:
+                                    try:
+                                        final = validate_message(message, allow_partial=False)
+                                    except Exception as validation_err:
+                                        # Leave it to result_stream.output, which reports the failure
+                                        logger.warning("Final output failed validation: %s", validation_err)
+                                    continue
+
+                                # Show progress, rate-limited to keep stdout writes off the per-chunk path
+                                progress_count += 1
+                                now = time.monotonic()
+                                if debug and now - last_print >= PROGRESS_INTERVAL:
+                                    sys.stdout.write(f"\rProcessing... ({progress_count} updates)")
+                                    sys.stdout.flush()
+                                    last_print = now
+
+                                # Skip validation between throttle points
+                                if progress_count % VALIDATE_EVERY and now - last_validate < VALIDATE_INTERVAL:
+                                    continue
+                                last_validate = now
+
+                                # Try to validate the partial response
+                                try:
+                                    partial = validate_message(message)
+
+                                    if partial and partial.files and now - last_progress >= PROGRESS_INTERVAL:
+                                        # Show a simple progress indicator
+                                        files_analyzed = len(partial.files)
+                                        sys.stdout.write(f"\rProgress: Analyzed {files_analyzed} files so far...")
+                                        sys.stdout.flush()
+                                        last_progress = now
+                                except Exception as validation_err:
+                                    # Validation errors are expected for partial results
+                                    logger.debug("Partial validation error: %s", validation_err)
+
+                            # Get and display the final result
+                            logger.info("Structured streaming completed")
+                            result = final if final is not None else result_stream.output
+                            logger.info(f"Final result: {result.model_dump_json()}")
+                            print("\n\nFinal analysis complete!\n")
+                            display_directory_content(result)
+
+                except asyncio.TimeoutError:
+                    print("\n\nError: Response timed out. Please try again with a smaller directory.")
+                    logger.error("Timeout while waiting for agent response")
+                except Exception as e:
+                    print(f"\n\nError: {str(e)}")
+                    logger.exception("Error running agent")
+
+    except Exception as e:
+        import traceback
+        print(f"\nError: {str(e)}")
+        logger.error(f"Error in main function: {str(e)}")
+        traceback.print_exc()
+    finally:
+        logger.info("Main function completed")
+
+async def batch_mode(paths: List[str], k: int = 4, debug: bool = False, model: Optional[str] = None):
+    """Analyze several directories concurrently, with at most k agent runs in flight"""
+    setup_logging(debug)
+    logger.info(f"Starting batch mode for {len(paths)} paths with concurrency {k}")
+    agent = get_agent(model, debug)
+    sem = asyncio.Semaphore(k)
+
+    async def analyze(path: str, st: os.stat_result):
+        async with sem:
+            prompt = build_analysis_prompt(path, st)
+            logger.info(f"Formatted prompt: {prompt}")
+            try:
+                async with asyncio.timeout(RESPONSE_TIMEOUT if debug else None):
+                    async with agent.run_stream(prompt) as result_stream:
+                        result = await result_stream.get_output()
+                logger.info(f"Final result for {path}: {result.model_dump_json()}")
+                display_directory_content(result)
+            except asyncio.TimeoutError:
+                print(f"\n\nError: Response timed out for '{path}'.")
+                logger.error(f"Timeout while waiting for agent response for {path}")
+            except Exception as e:
+                print(f"\n\nError analyzing '{path}': {str(e)}")
+                logger.error(f"Error running agent for {path}: {str(e)}")
+
+    existing = []
+    for path in paths:
+        try:
+            existing.append((path, os.stat(path)))
+        except OSError:
+            print(f"\nError: Path '{path}' does not exist.")
+            logger.warning(f"Path does not exist: {path}")
+
+    # Run the agent with MCP servers
+    async with agent.run_mcp_servers():
+        logger.info("MCP servers started successfully")
+        await asyncio.gather(*(analyze(path, st) for path, st in existing))
+    logger.info("Batch mode completed")
+
+def cli(argv: Optional[List[str]] = None, debug: bool = False):
+    """Parse command line arguments and run interactively, or in batch mode when paths are given"""
+    parser = argparse.ArgumentParser(description="Filesystem analysis agent with structured streaming")
+    parser.add_argument("paths", nargs="*", help="Directories to analyze concurrently instead of prompting")
+    parser.add_argument("--debug", action="store_true", default=debug,
+                        help="Log each step, show per-chunk progress, enable timeouts and use faster test models")
+    parser.add_argument("--model", default=None, help="Model name to use instead of the provider default")
+    args = parser.parse_args(argv)
+
+    # Checked after argument parsing so --help works without any keys set
+    if not OPENROUTER_API_KEY and not OPENAI_API_KEY:
+        raise ValueError("Either OPENROUTER_API_KEY or OPENAI_API_KEY must be set")
+
+    try:
+        if sys.platform == 'win32':
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        if args.paths:
+            asyncio.run(batch_mode(args.paths, debug=args.debug, model=args.model))
+        else:
+            asyncio.run(main(debug=args.debug, model=args.model))
+    except KeyboardInterrupt:
+        logger.info("Program interrupted by user")
+        print("\nProgram interrupted by user.")
+    except Exception as e:
+        import traceback
+        logger.error(f"Unhandled exception: {str(e)}")
+        traceback.print_exc()
+    finally:
+        logger.info("Program exit")
+
+if __name__ == "__main__":
+    cli()
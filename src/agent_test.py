@@ -1,16 +1,22 @@
 #!/usr/bin/env python3
 
-from pydantic_ai import Agent
-from pydantic_ai.mcp import MCPServerStdio
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
+from __future__ import annotations
 
 import os
 import asyncio
 import logging
-import traceback
+import functools
+import time
+import sys
 from pathlib import Path
+from collections import deque
 from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+# pydantic_ai is slow to import, so it's imported inside the functions that
+# need it; API key errors then fail fast without paying for it
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
 
 # Configure logging
 logging.basicConfig(
@@ -27,11 +33,11 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY and not OPENAI_API_KEY:
     raise ValueError("Either OPENROUTER_API_KEY or OPENAI_API_KEY must be set")
 
+# Minimum time between stdout flushes while streaming deltas
+FLUSH_INTERVAL = 0.05  # seconds
+
 # Setup agent system prompt
-def load_agent_prompt() -> str:
-    """Create a simple system prompt for the filesystem agent"""
-    time_now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-    return f"""
+_PROMPT_TEMPLATE = """
     # Filesystem Agent
 
     You are a helpful assistant that specializes in working with the filesystem.
@@ -55,9 +61,17 @@ def load_agent_prompt() -> str:
     - When showing file contents, display them in an appropriate format
     """
 
+def load_agent_prompt() -> str:
+    """Create a simple system prompt for the filesystem agent"""
+    time_now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    return _PROMPT_TEMPLATE.format(time_now=time_now)
+
 # Set up model and provider
 def create_model():
     """Create the model with the appropriate provider"""
+    from pydantic_ai.models.openai import OpenAIModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
     if OPENROUTER_API_KEY:
         provider = OpenAIProvider(
             base_url='https://openrouter.ai/api/v1',
@@ -75,6 +89,9 @@ def create_model():
 # Create the agent
 def create_agent():
     """Create the agent with the filesystem MCP server"""
+    from pydantic_ai import Agent
+    from pydantic_ai.mcp import MCPServerStdio
+
     model = create_model()
     logger.info(f"Created model: {model}")
     
@@ -98,9 +115,14 @@ def create_agent():
     
     return agent
 
+@functools.cache
+def get_agent() -> Agent:
+    """Return the process-wide agent, creating it and its MCP server on first use"""
+    return create_agent()
+
 async def main():
     """Run the filesystem agent with delta streaming"""
-    agent = create_agent()
+    agent = get_agent()
     
     print("\nFilesystem Agent (Delta Streaming)")
     print("=====================================\n")
@@ -108,7 +130,8 @@ async def main():
     
     # Run the agent with MCP servers
     async with agent.run_mcp_servers():
-        message_history = []
+        # Keep message history limited to the last 10 messages
+        message_history = deque(maxlen=10)
         result = None
         
         while True:
@@ -116,36 +139,38 @@ async def main():
             if result:
                 print("\n")
             
-            # Get user input
-            user_input = input("> ")
+            # Get user input without blocking the event loop
+            user_input = await asyncio.to_thread(input, "> ")
             if user_input.lower() == 'exit':
                 break
             
             # Run the agent with streaming
             try:
                 print("\nAgent: ", end="", flush=True)
-                async with agent.run_stream(user_input, message_history=message_history) as result_stream:
-                    # Initialize a variable to accumulate the complete response
-                    complete_response = ""
+                async with agent.run_stream(user_input, message_history=list(message_history)) as result_stream:
+                    # Collect deltas in a list and join once at the end
+                    parts: list[str] = []
+                    last_flush = time.monotonic()
                     
                     # Use delta streaming to show output as it's generated
                     async for delta in result_stream.stream_text(delta=True):
-                        print(delta, end="", flush=True)
-                        complete_response += delta
+                        parts.append(delta)
+                        sys.stdout.write(delta)
+                        now = time.monotonic()
+                        if now - last_flush >= FLUSH_INTERVAL:
+                            sys.stdout.flush()
+                            last_flush = now
+                    sys.stdout.flush()
+                    complete_response = "".join(parts)
                     
                     # Get the full response and update message history
                     result = result_stream
                     message_history.append({"role": "user", "content": user_input})
                     message_history.append({"role": "assistant", "content": complete_response})
-                    
-                    # Keep message history limited to last 10 messages
-                    if len(message_history) > 10:
-                        message_history = message_history[-10:]
             
             except Exception as e:
                 print(f"\n\nError: {str(e)}")
-                logger.error(f"Error running agent: {str(e)}")
-                traceback.print_exc()
+                logger.exception("Error running agent")
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -4,66 +4,103 @@ from pydantic_ai import Agent, RunContext
 from pydantic_ai.mcp import MCPServerStdio
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.messages import ModelMessage, SystemPromptPart, UserPromptPart, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, SystemPromptPart, UserPromptPart, TextPart, ToolCallPart, ToolReturnPart
 from pydantic_ai.agent import AgentRunResult
 
 import os
 import asyncio
 import logging
-import traceback
+import queue
+import functools
 import time
+import hashlib
 import sys
+from contextlib import AsyncExitStack
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Tuple, FrozenSet
 
 # Ensure logs directory exists
 log_dir = Path("logs")
 log_dir.mkdir(exist_ok=True)
 
-# Configure logging
+# Configure logging. Records are handed to a queue and written by a background
+# listener thread, so the streaming loop never blocks on file or console I/O.
+# Library DEBUG output is only enabled when AGENT_DEBUG is set.
+_debug_logging = bool(os.getenv("AGENT_DEBUG"))
+_log_queue = queue.Queue(-1)
+_log_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+_log_handlers = [
+    logging.FileHandler(log_dir / "debug.log"),  # Use the logs directory for log files
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+# Started and stopped around the run in __main__; records logged before then wait in the queue
+_log_listener = QueueListener(_log_queue, *_log_handlers)
+# The queue handler only merges the message args; the listener's handlers add the prefix
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))
 logging.basicConfig(
-    level=logging.DEBUG,  # Increased to DEBUG for more verbose logs
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_dir / "debug.log"),  # Use the logs directory for log files
-        logging.StreamHandler()
-    ]
+    level=logging.DEBUG if _debug_logging else logging.INFO,
+    handlers=[_queue_handler]
 )
 logger = logging.getLogger("agent_test_fixed")
 
-# Log to stdout
-logging.getLogger('pydantic_ai').setLevel(logging.DEBUG)
-logging.getLogger('asyncio').setLevel(logging.DEBUG)
+if _debug_logging:
+    logging.getLogger('pydantic_ai').setLevel(logging.DEBUG)
+    logging.getLogger('asyncio').setLevel(logging.DEBUG)
 
 # Log script startup
 logger.info("=== Agent Test Script Starting ===")
-logger.info(f"Python version: {sys.version}")
-logger.info(f"Current working directory: {os.getcwd()}")
+logger.info("Python version: %s", sys.version)
+logger.info("Current working directory: %s", os.getcwd())
 
 # Load environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-logger.info(f"OPENAI_API_KEY set: {'Yes' if OPENAI_API_KEY else 'No'}")
-logger.info(f"OPENROUTER_API_KEY set: {'Yes' if OPENROUTER_API_KEY else 'No'}")
+def check_api_keys() -> None:
+    """Log which API keys are set and fail if there are none"""
+    logger.info("OPENAI_API_KEY set: %s", 'Yes' if OPENAI_API_KEY else 'No')
+    logger.info("OPENROUTER_API_KEY set: %s", 'Yes' if OPENROUTER_API_KEY else 'No')
+    
+    if not OPENROUTER_API_KEY and not OPENAI_API_KEY:
+        logger.error("No API keys found in environment variables")
+        raise ValueError("Either OPENROUTER_API_KEY or OPENAI_API_KEY must be set")
+
+# Buffered stdout writes while streaming deltas
+FLUSH_CHARS = 256
+FLUSH_INTERVAL = 0.016  # seconds
 
-if not OPENROUTER_API_KEY and not OPENAI_API_KEY:
-    logger.error("No API keys found in environment variables")
-    raise ValueError("Either OPENROUTER_API_KEY or OPENAI_API_KEY must be set")
+# Message kinds used by filtered_message_history
+_TEXT = 0
+_SYSTEM = 1
+_TOOL = 2
 
 # Function to filter message history
 def filtered_message_history(
     result: Optional[AgentRunResult], 
-    limit: Optional[int] = None, 
+    recent: int = 8,
+    cache_buffer: int = 8,
+    anchor: int = 2,
     include_tool_messages: bool = True
 ) -> Optional[List[ModelMessage]]:
     """
-    Filter and limit the message history from an AgentRunResult.
+    Filter and bound the message history from an AgentRunResult, keeping its prefix stable.
+    
+    The system message and the first `anchor` non-system messages are always kept. The
+    history then grows until it holds more than `recent + cache_buffer` non-system messages,
+    at which point whole blocks of `cache_buffer` messages right after the anchor are dropped
+    at once. Between drops the history only grows at the end, so the prefix sent to the
+    provider stays byte-identical and prompt caching keeps hitting.
     
     Args:
         result: The AgentRunResult object with message history
-        limit: Optional int, if provided returns only system message + last N messages
+        recent: Number of non-system messages kept after a block is dropped
+        cache_buffer: Number of messages the history may grow by before a block is dropped
+        anchor: Number of leading non-system messages that are never dropped
         include_tool_messages: Whether to include tool messages in the history
         
     Returns:
@@ -75,42 +112,62 @@ def filtered_message_history(
     # Get all messages
     messages: List[ModelMessage] = result.all_messages()
     
-    # Extract system message (always the first one with role="system")
-    system_message = next((msg for msg in messages if any(isinstance(part, SystemPromptPart) for part in msg.parts)), None)
-    
-    # Filter non-system messages
-    non_system_messages = [msg for msg in messages if not any(isinstance(part, SystemPromptPart) for part in msg.parts)]
+    # Classify every message in a single pass over its parts, dropping tool messages
+    # as we go if they aren't wanted. Exact type checks are enough here since the part
+    # classes are never subclassed.
+    system_part, call_part, return_part = SystemPromptPart, ToolCallPart, ToolReturnPart
+    skip = _SYSTEM if include_tool_messages else _SYSTEM | _TOOL
+    system_message: Optional[ModelMessage] = None
+    non_system_messages: List[ModelMessage] = []
+    for msg in messages:
+        kind = _TEXT
+        for part in msg.parts:
+            part_type = type(part)
+            if part_type is system_part:
+                kind |= _SYSTEM
+            elif part_type is call_part or part_type is return_part:
+                kind |= _TOOL
+        if kind & _SYSTEM and system_message is None:
+            # Keep only the first system message
+            system_message = msg
+        if not kind & skip:
+            non_system_messages.append(msg)
     
-    # Apply tool message filtering if requested
-    if not include_tool_messages:
-        non_system_messages = [msg for msg in non_system_messages if not any(isinstance(part, ToolCallPart) or isinstance(part, ToolReturnPart) for part in msg.parts)]
-    
-    # Apply limit if specified, but ensure paired tool calls and returns stay together
-    if limit is not None and limit > 0:
-        # Identify tool call IDs and their corresponding return parts
-        tool_call_ids = {}
-        tool_return_ids = set()
+    # Once the buffer is exceeded, drop whole blocks after the anchor, but ensure paired
+    # tool calls and returns stay together
+    limit = recent + cache_buffer
+    if cache_buffer > 0 and len(non_system_messages) > limit:
+        excess = len(non_system_messages) - limit
+        drop = -(-excess // cache_buffer) * cache_buffer
+        drop_end = min(anchor + drop, len(non_system_messages))
+        
+        included_indices = set(range(anchor)) | set(range(drop_end, len(non_system_messages)))
         
-        for i, msg in enumerate(non_system_messages):
+        # Find the tool returns in the kept window whose calls are not in the window too
+        needed_ids = set()
+        window_call_ids = set()
+        for msg in non_system_messages[drop_end:]:
             for part in msg.parts:
-                if isinstance(part, ToolCallPart):
-                    tool_call_ids[part.tool_call_id] = i
-                elif isinstance(part, ToolReturnPart):
-                    tool_return_ids.add(part.tool_call_id)
+                part_type = type(part)
+                if part_type is return_part:
+                    needed_ids.add(part.tool_call_id)
+                elif part_type is call_part:
+                    window_call_ids.add(part.tool_call_id)
+        needed_ids -= window_call_ids
         
-        # Take the last 'limit' messages but ensure we include paired messages
-        if len(non_system_messages) > limit:
-            included_indices = set(range(len(non_system_messages) - limit, len(non_system_messages)))
-            
-            # Include any missing tool call messages for tool returns that are included
-            for i, msg in enumerate(non_system_messages):
-                if i in included_indices:
-                    for part in msg.parts:
-                        if isinstance(part, ToolReturnPart) and part.tool_call_id in tool_call_ids:
-                            included_indices.add(tool_call_ids[part.tool_call_id])
-            
-            # Create a new list with only the included messages
-            non_system_messages = [msg for i, msg in enumerate(non_system_messages) if i in included_indices]
+        # Walk back through the dropped block to include the matching tool call messages
+        i = drop_end - 1
+        while needed_ids and i >= anchor:
+            for part in non_system_messages[i].parts:
+                if type(part) is call_part and part.tool_call_id in needed_ids:
+                    needed_ids.discard(part.tool_call_id)
+                    included_indices.add(i)
+            i -= 1
+        
+        logger.info("Dropping %s messages after the first %s to bound history", drop_end - anchor, anchor)
+        
+        # Create a new list with only the included messages
+        non_system_messages = [msg for i, msg in enumerate(non_system_messages) if i in included_indices]
     
     # Combine system message with other messages
     result_messages = []
@@ -118,17 +175,26 @@ def filtered_message_history(
         result_messages.append(system_message)
     result_messages.extend(non_system_messages)
     
+    # Hash the whole history and the part of it that was already sent before the last run.
+    # When the prefix is stable, each call's prefix hash equals the previous call's history
+    # hash, so this shows in the logs whether prompt caching can hit. The last run's messages
+    # are at the end of the list whatever was dropped or filtered, so they are found by identity.
+    if logger.isEnabledFor(logging.DEBUG):
+        new_ids = {id(msg) for msg in result.new_messages()}
+        prefix_len = sum(1 for msg in result_messages if id(msg) not in new_ids)
+        prefix_digest = hashlib.sha256(ModelMessagesTypeAdapter.dump_json(result_messages[:prefix_len])).hexdigest()[:16]
+        full_digest = hashlib.sha256(ModelMessagesTypeAdapter.dump_json(result_messages)).hexdigest()[:16]
+        logger.debug("History hash: %s (%s messages); prefix from before the last run: %s (%s messages)",
+                     full_digest, len(result_messages), prefix_digest, prefix_len)
+    
     return result_messages
 
 # Setup agent system prompt
-def load_agent_prompt() -> str:
-    """Create a simple system prompt for the filesystem agent"""
-    time_now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-    prompt = f"""
+_PROMPT_TEMPLATE = """
     # Filesystem Agent
 
     You are a helpful assistant that specializes in working with the filesystem.
-    Current time: {time_now}
+    Current date: {today}
 
     ## Capabilities
     - You can list files and directories
@@ -147,65 +213,115 @@ def load_agent_prompt() -> str:
     - When showing file or directory listings, format them nicely
     - When showing file contents, display them in an appropriate format
     """
+
+@functools.lru_cache(maxsize=1)
+def _build_agent_prompt(today: str) -> str:
+    """Fill the prompt template for a given date; cached so it's only rebuilt when the date changes"""
+    return _PROMPT_TEMPLATE.format(today=today)
+
+def load_agent_prompt() -> str:
+    """Create a simple system prompt for the filesystem agent"""
+    # Day granularity keeps the system prompt (and the provider's prompt cache) stable all day
+    prompt = _build_agent_prompt(datetime.now(timezone.utc).strftime("%Y-%m-%d"))
     logger.info("Agent prompt loaded")
     return prompt
 
 # Set up model and provider
-def create_model():
-    """Create the model with the appropriate provider"""
-    try:
+# Provider shared by every model in this process, so its HTTP connection pool is reused
+_PROVIDER: Optional[OpenAIProvider] = None
+
+def get_provider() -> OpenAIProvider:
+    """Get the shared provider, creating it for the available API key on first use"""
+    global _PROVIDER
+    if _PROVIDER is None:
         if OPENROUTER_API_KEY:
-            logger.info("Creating model with OpenRouter provider")
-            provider = OpenAIProvider(
+            logger.info("Creating OpenRouter provider")
+            _PROVIDER = OpenAIProvider(
                 base_url='https://openrouter.ai/api/v1',
                 api_key=OPENROUTER_API_KEY
             )
             logger.info("OpenRouter provider created")
-            model_name = 'anthropic/claude-3-haiku'  # Using a simpler/faster model for testing
         else:
-            logger.info("Creating model with OpenAI provider")
-            provider = OpenAIProvider(api_key=OPENAI_API_KEY)
+            logger.info("Creating OpenAI provider")
+            _PROVIDER = OpenAIProvider(api_key=OPENAI_API_KEY)
             logger.info("OpenAI provider created")
+    return _PROVIDER
+
+def create_model():
+    """Create the model with the appropriate provider"""
+    try:
+        provider = get_provider()
+        if OPENROUTER_API_KEY:
+            model_name = 'anthropic/claude-3-haiku'  # Using a simpler/faster model for testing
+        else:
             model_name = 'gpt-3.5-turbo'  # Using a faster model for testing
         
-        logger.info(f"Creating model with name: {model_name}")
+        logger.info("Creating model with name: %s", model_name)
         model = OpenAIModel(model_name, provider=provider)
         logger.info("Model created successfully")
         return model
     except Exception as e:
-        logger.error(f"Error creating model: {str(e)}")
+        logger.error("Error creating model: %s", e)
         raise
 
+# Absolute path to the MCP server script, resolved and checked once at import
+_MCP_SERVER_PATH = (Path(__file__).parent / "mcp_servers" / "filesystem_mcp.py").resolve()
+_MCP_SERVER_EXISTS = _MCP_SERVER_PATH.exists()
+
+# Environment for the MCP server with the log directory passed through, and its
+# server cache key, built once rather than copied and hashed on every call
+_MCP_ENV = {**os.environ, "LOG_DIR": str(log_dir)}
+_MCP_ENV_KEY = frozenset(_MCP_ENV.items())
+
+@functools.lru_cache(maxsize=None)
+def _ensure_executable(p: str) -> None:
+    """Make a script executable, checking each path only once per process"""
+    if not os.access(p, os.X_OK):
+        logger.info("Making MCP server script executable: %s", p)
+        os.chmod(p, 0o755)
+
+# MCP servers shared by every agent in this process, keyed by script path and environment
+_MCP_SERVERS: Dict[Tuple[str, Optional[FrozenSet[Tuple[str, str]]]], MCPServerStdio] = {}
+
+def get_mcp_server(
+    path: str,
+    env: Optional[Dict[str, str]] = None,
+    env_key: Optional[FrozenSet[Tuple[str, str]]] = None
+) -> MCPServerStdio:
+    """Get the MCP server for a script, creating it on first use; env_key may be passed precomputed"""
+    if env_key is None and env is not None:
+        env_key = frozenset(env.items())
+    key = (path, env_key)
+    server = _MCP_SERVERS.get(key)
+    if server is None:
+        logger.info("Creating MCP server...")
+        server = _MCP_SERVERS[key] = MCPServerStdio('python', [path], env=env)
+        logger.info("MCP server created")
+    return server
+
+# Prepare the MCP server
+def prepare_mcp_server() -> MCPServerStdio:
+    """Check the filesystem MCP server script and get the shared server for it"""
+    # Ensure the MCP server script exists
+    mcp_server_path = _MCP_SERVER_PATH
+    logger.info("MCP server path: %s", mcp_server_path)
+    if not _MCP_SERVER_EXISTS:
+        logger.error("MCP server script not found at: %s", mcp_server_path)
+        raise FileNotFoundError(f"MCP server script not found at: {mcp_server_path}")
+        
+    # Ensure the MCP server script is executable
+    _ensure_executable(str(mcp_server_path))
+    
+    # Get the shared MCP server
+    return get_mcp_server(str(mcp_server_path), _MCP_ENV, _MCP_ENV_KEY)
+
 # Create the agent
 def create_agent():
     """Create the agent with the filesystem MCP server"""
     try:
         logger.info("Creating agent...")
         model = create_model()
-        
-        # Get the absolute path to the MCP server script
-        script_dir = Path(__file__).parent.absolute()
-        mcp_server_path = script_dir / "mcp_servers" / "filesystem_mcp.py"  # Use the new version
-        logger.info(f"MCP server path: {mcp_server_path}")
-        
-        # Ensure the MCP server script exists
-        if not mcp_server_path.exists():
-            logger.error(f"MCP server script not found at: {mcp_server_path}")
-            raise FileNotFoundError(f"MCP server script not found at: {mcp_server_path}")
-            
-        # Ensure the MCP server script is executable
-        if not os.access(mcp_server_path, os.X_OK):
-            logger.info(f"Making MCP server script executable: {mcp_server_path}")
-            os.chmod(mcp_server_path, 0o755)
-        
-        # Set environment variables for the MCP server
-        mcp_env = os.environ.copy()
-        mcp_env["LOG_DIR"] = str(log_dir)  # Pass log directory to MCP server
-        
-        # Create the MCP server
-        logger.info("Creating MCP server...")
-        mcp_server = MCPServerStdio('python', [str(mcp_server_path)], env=mcp_env)
-        logger.info("MCP server created")
+        mcp_server = prepare_mcp_server()
         
         # Create the agent
         agent_prompt = load_agent_prompt()
@@ -215,7 +331,7 @@ def create_agent():
         
         return agent
     except Exception as e:
-        logger.error(f"Error creating agent: {str(e)}")
+        logger.error("Error creating agent: %s", e)
         raise
 
 async def main():
@@ -230,94 +346,110 @@ async def main():
         
         # Add timeout for starting MCP servers
         logger.info("Starting MCP servers...")
-        try:
-            # Run the agent with MCP servers
-            async with asyncio.timeout(30):  # 30-second timeout for starting MCP servers
-                async with agent.run_mcp_servers() as mcp_manager:
-                    logger.info("MCP servers started successfully")
+        async with AsyncExitStack() as stack:
+            try:
+                # Only entering the MCP server context is bounded; the REPL below runs without it
+                async with asyncio.timeout(30):  # 30-second timeout for starting MCP servers
+                    await stack.enter_async_context(agent.run_mcp_servers())
+            except asyncio.TimeoutError:
+                print("\nError: Timed out while starting MCP servers. Please check the logs and try again.")
+                logger.error("Timeout while starting MCP servers")
+                return
+            logger.info("MCP servers started successfully")
+            
+            result = None
+            
+            while True:
+                # Print previous result if available
+                if result:
+                    print("\n")
+                
+                # Get user input without blocking the event loop
+                user_input = await asyncio.to_thread(input, "> ")
+                logger.info("User input: %s", user_input)
+                
+                if user_input.lower() == 'exit':
+                    logger.info("User requested exit")
+                    break
+                
+                # Run the agent with streaming
+                try:
+                    print("\nAgent: ", end="", flush=True)
+                    logger.info("Starting agent.run_stream...")
+                    
+                    # Use the filtered message history function
+                    filtered_messages = filtered_message_history(
+                        result,
+                        recent=8,  # Keep 8 non-system messages after a drop
+                        cache_buffer=8,  # Grow by up to 8 before dropping a block
+                        include_tool_messages=True  # Include tool messages
+                    )
                     
-                    result = None
+                    # Log the number of messages being used
+                    if filtered_messages:
+                        logger.info("Using %s filtered messages in history", len(filtered_messages))
+                    else:
+                        logger.info("No message history available for this run")
                     
-                    while True:
-                        # Print previous result if available
-                        if result:
-                            print("\n")
-                        
-                        # Get user input
-                        print("> ", end="", flush=True)
-                        user_input = input()
-                        logger.info(f"User input: {user_input}")
-                        
-                        if user_input.lower() == 'exit':
-                            logger.info("User requested exit")
-                            break
-                        
-                        # Run the agent with streaming
-                        try:
-                            print("\nAgent: ", end="", flush=True)
-                            logger.info("Starting agent.run_stream...")
+                    # Add timeout for agent run
+                    async with asyncio.timeout(60):  # 60-second timeout for agent response
+                        async with agent.run_stream(user_input, message_history=filtered_messages) as result_stream:
+                            logger.info("Agent run_stream started, beginning to stream response...")
                             
-                            # Use the filtered message history function
-                            filtered_messages = filtered_message_history(
-                                result,
-                                limit=8,  # Last 8 non-system messages
-                                include_tool_messages=True  # Include tool messages
-                            )
+                            # Collect deltas in a list and write them to stdout in batches
+                            parts: List[str] = []
+                            flushed = 0
+                            pending = 0
+                            last_flush = time.monotonic()
                             
-                            # Log the number of messages being used
-                            if filtered_messages:
-                                logger.info(f"Using {len(filtered_messages)} filtered messages in history")
-                            else:
-                                logger.info("No message history available for this run")
+                            # Use delta streaming to show output as it's generated
+                            async for delta in result_stream.stream_text(delta=True):
+                                parts.append(delta)
+                                pending += len(delta)
+                                now = time.monotonic()
+                                if pending >= FLUSH_CHARS or now - last_flush >= FLUSH_INTERVAL:
+                                    sys.stdout.write("".join(parts[flushed:]))
+                                    sys.stdout.flush()
+                                    flushed = len(parts)
+                                    pending = 0
+                                    last_flush = now
+                            sys.stdout.write("".join(parts[flushed:]))
+                            sys.stdout.flush()
+                            complete_response = "".join(parts)
                             
-                            # Add timeout for agent run
-                            async with asyncio.timeout(60):  # 60-second timeout for agent response
-                                async with agent.run_stream(user_input, message_history=filtered_messages) as result_stream:
-                                    logger.info("Agent run_stream started, beginning to stream response...")
-                                    
-                                    # Initialize a variable to accumulate the complete response
-                                    complete_response = ""
-                                    
-                                    # Use delta streaming to show output as it's generated
-                                    async for delta in result_stream.stream_text(delta=True):
-                                        print(delta, end="", flush=True)
-                                        complete_response += delta
-                                    
-                                    # Get the full response
-                                    result = result_stream
-                                    logger.info(f"Complete response received, length: {len(complete_response)}")
-                                    
-                        except asyncio.TimeoutError:
-                            print("\n\nError: Response timed out. Please try again.")
-                            logger.error("Timeout while waiting for agent response")
-                        except Exception as e:
-                            print(f"\n\nError: {str(e)}")
-                            logger.error(f"Error running agent: {str(e)}")
-                            traceback.print_exc()
-        
-        except asyncio.TimeoutError:
-            print("\nError: Timed out while starting MCP servers. Please check the logs and try again.")
-            logger.error("Timeout while starting MCP servers")
-            return
+                            # Get the full response
+                            result = result_stream
+                            logger.info("Complete response received, length: %s", len(complete_response))
+                            
+                except asyncio.TimeoutError:
+                    print("\n\nError: Response timed out. Please try again.")
+                    logger.error("Timeout while waiting for agent response")
+                except Exception as e:
+                    print(f"\n\nError: {str(e)}")
+                    logger.exception("Error running agent")
     
     except Exception as e:
         print(f"\nError: {str(e)}")
-        logger.error(f"Error in main function: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in main function")
     finally:
         logger.info("Main function completed")
 
 if __name__ == "__main__":
-    logger.info("Running main function")
+    _log_listener.start()
     try:
-        if sys.platform == 'win32':
-            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        logger.info("Program interrupted by user")
-        print("\nProgram interrupted by user.")
-    except Exception as e:
-        logger.error(f"Unhandled exception: {str(e)}")
-        traceback.print_exc()
+        # Checked with the listener running so the error is written out before exiting
+        check_api_keys()
+        logger.info("Running main function")
+        try:
+            if sys.platform == 'win32':
+                asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            logger.info("Program interrupted by user")
+            print("\nProgram interrupted by user.")
+        except Exception as e:
+            logger.exception("Unhandled exception")
+        finally:
+            logger.info("Program exit")
     finally:
-        logger.info("Program exit")
+        _log_listener.stop()
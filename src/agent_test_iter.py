@@ -4,16 +4,38 @@ from pydantic_ai import Agent
 from pydantic_ai.mcp import MCPServerStdio
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.messages import ToolCallPart, TextPart, ModelResponse
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, TextPart, ToolCallPart, UserPromptPart
 
 import os
 import asyncio
 import logging
-import traceback
+import functools
 import json
+from dataclasses import dataclass, field
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, FrozenSet
+
+# Prefer orjson for serializing tool-call args when it's installed
+try:
+    import orjson
+
+    def dumps(obj: Any, indent: bool = False) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+except ImportError:
+    def dumps(obj: Any, indent: bool = False) -> str:
+        return json.dumps(obj, indent=2 if indent else None)
+
+def raw_args(part: ToolCallPart) -> str:
+    """Get a tool call's args as JSON text, without parsing them when they already are"""
+    return part.args if isinstance(part.args, str) else dumps(part.args)
+
+def pretty_args(raw: str) -> str:
+    """Indent JSON args for display, falling back to the raw text if they don't parse"""
+    try:
+        return dumps(json.loads(raw), indent=True)
+    except ValueError:
+        return raw
 
 # Configure logging
 logging.basicConfig(
@@ -35,15 +57,18 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY and not OPENAI_API_KEY:
     raise ValueError("Either OPENROUTER_API_KEY or OPENAI_API_KEY must be set")
 
+# Conversation history bounds: the first HISTORY_ANCHOR messages are always kept, and once
+# the rest grows past HISTORY_RECENT + HISTORY_BUFFER a whole block is dropped after the anchor
+HISTORY_ANCHOR = 1
+HISTORY_RECENT = 8
+HISTORY_BUFFER = 8
+
 # Setup agent system prompt
-def load_agent_prompt() -> str:
-    """Create a simple system prompt for the filesystem agent"""
-    time_now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-    return f"""
+_PROMPT_TEMPLATE = """
     # Filesystem Agent
 
     You are a helpful assistant that specializes in working with the filesystem.
-    Current time: {time_now}
+    Current date: {today}
 
     ## Capabilities
     - You can list files and directories
@@ -64,59 +89,93 @@ def load_agent_prompt() -> str:
     - Always provide a summary response after tool calls
     """
 
-# Set up model and provider
-def create_model():
-    """Create the model with the appropriate provider"""
-    logger.info("Creating model with OpenRouter provider")
-    if OPENROUTER_API_KEY:
-        try:
-            provider = OpenAIProvider(
+@functools.lru_cache(maxsize=1)
+def _build_agent_prompt(today: str) -> str:
+    """Fill the prompt template for a given date; cached so it's only rebuilt when the date changes"""
+    return _PROMPT_TEMPLATE.format(today=today)
+
+def load_agent_prompt() -> str:
+    """Create a simple system prompt for the filesystem agent"""
+    # Day granularity keeps the system prompt (and the provider's prompt cache) stable all day
+    return _build_agent_prompt(datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+
+# Provider shared by every model in this process, so its HTTP connection pool is reused
+_PROVIDER: Optional[OpenAIProvider] = None
+
+def get_provider() -> OpenAIProvider:
+    """Get the shared provider, creating it for the available API key on first use"""
+    global _PROVIDER
+    if _PROVIDER is None:
+        if OPENROUTER_API_KEY:
+            _PROVIDER = OpenAIProvider(
                 base_url='https://openrouter.ai/api/v1',
                 api_key=OPENROUTER_API_KEY
             )
             logger.info("OpenRouter provider created")
-            model_name = 'anthropic/claude-3-haiku'  # Using Claude 3 Haiku via OpenRouter
-            logger.info(f"Creating model with name: {model_name}")
-            model = OpenAIModel(model_name, provider=provider)
-            logger.info("Model created successfully")
-            return model
-        except Exception as e:
-            logger.error(f"Error creating OpenRouter model: {str(e)}")
-            raise
-    else:
-        try:
-            provider = OpenAIProvider(api_key=OPENAI_API_KEY)
+        else:
+            _PROVIDER = OpenAIProvider(api_key=OPENAI_API_KEY)
             logger.info("OpenAI provider created")
-            model_name = 'gpt-4o'  # Default to GPT-4o if using OpenAI directly
-            logger.info(f"Creating model with name: {model_name}")
-            model = OpenAIModel(model_name, provider=provider)
-            logger.info("Model created successfully")
-            return model
-        except Exception as e:
-            logger.error(f"Error creating OpenAI model: {str(e)}")
-            raise
+    return _PROVIDER
+
+# Set up model and provider
+def create_model():
+    """Create the model with the appropriate provider"""
+    if OPENROUTER_API_KEY:
+        logger.info("Creating model with OpenRouter provider")
+        model_name = 'anthropic/claude-3-haiku'  # Using Claude 3 Haiku via OpenRouter
+    else:
+        logger.info("Creating model with OpenAI provider")
+        model_name = 'gpt-4o'  # Default to GPT-4o if using OpenAI directly
+    try:
+        provider = get_provider()
+        logger.info("Creating model with name: %s", model_name)
+        model = OpenAIModel(model_name, provider=provider)
+        logger.info("Model created successfully")
+        return model
+    except Exception as e:
+        logger.error("Error creating model: %s", e)
+        raise
+
+# Absolute path to the MCP server script, resolved once at import
+_MCP_SERVER_PATH = (Path(__file__).parent / "mcp_servers" / "filesystem_mcp.py").resolve()
+
+@functools.lru_cache(maxsize=None)
+def _ensure_executable(p: str) -> None:
+    """Make a script executable, checking each path only once per process"""
+    if not os.access(p, os.X_OK):
+        logger.info("Making MCP server script executable: %s", p)
+        os.chmod(p, 0o755)
+
+# MCP servers shared by every agent in this process, keyed by script path and environment
+_MCP_SERVERS: Dict[Tuple[str, Optional[FrozenSet[Tuple[str, str]]]], MCPServerStdio] = {}
+
+def get_mcp_server(path: str, env: Optional[Dict[str, str]] = None) -> MCPServerStdio:
+    """Get the MCP server for a script, creating it on first use"""
+    key = (path, frozenset(env.items()) if env is not None else None)
+    server = _MCP_SERVERS.get(key)
+    if server is None:
+        logger.info("Creating MCP server...")
+        server = _MCP_SERVERS[key] = MCPServerStdio('python', [path], env=env)
+        logger.info("MCP server created")
+    return server
+
+# Prepare the MCP server
+def prepare_mcp_server() -> MCPServerStdio:
+    """Check the filesystem MCP server script and get the shared server for it"""
+    mcp_server_path = _MCP_SERVER_PATH
+    logger.info("MCP server path: %s", mcp_server_path)
+    
+    # Ensure the MCP server script is executable
+    _ensure_executable(str(mcp_server_path))
+    
+    # Get the shared MCP server
+    return get_mcp_server(str(mcp_server_path))
 
 # Create the agent
 def create_agent():
     """Create the agent with the filesystem MCP server"""
     model = create_model()
-    
-    # Get the absolute path to the MCP server script
-    script_dir = Path(__file__).parent.absolute()
-    mcp_server_path = script_dir / "mcp_servers" / "filesystem_mcp.py"
-    logger.info(f"MCP server path: {mcp_server_path}")
-    
-    # Ensure the MCP server script is executable
-    if not os.access(mcp_server_path, os.X_OK):
-        logger.info(f"Making MCP server script executable: {mcp_server_path}")
-        os.chmod(mcp_server_path, 0o755)
-    
-    # Create the MCP server
-    logger.info("Creating MCP server...")
-    mcp_server = MCPServerStdio('python', [str(mcp_server_path)])
-    logger.info("MCP server created")
-    
-    # Create the agent
+    mcp_server = prepare_mcp_server()
     prompt = load_agent_prompt()
     logger.info("Agent prompt loaded")
     
@@ -126,20 +185,19 @@ def create_agent():
     
     return agent
 
+@dataclass(slots=True)
 class ToolStateTracker:
     """Track tool calls and their results for proper streaming output handling"""
     
-    def __init__(self):
-        self.tool_calls = {}
-        self.tool_results = {}
-        self.text_output = []
-        self.final_output = ""
+    tool_calls: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    tool_results: Dict[str, Any] = field(default_factory=dict)
+    text_parts: List[str] = field(default_factory=list)
     
     def add_tool_call(self, tool_call: ToolCallPart):
         """Record a new tool call"""
         self.tool_calls[tool_call.tool_call_id] = {
             "tool_name": tool_call.tool_name,
-            "args": tool_call.args_as_dict() if hasattr(tool_call, "args_as_dict") else tool_call.args
+            "args": raw_args(tool_call)
         }
     
     def add_tool_result(self, tool_call_id: str, result: Any):
@@ -148,14 +206,45 @@ class ToolStateTracker:
     
     def add_text(self, text: str):
         """Add text output"""
-        self.text_output.append(text)
-        self.final_output += text
+        self.text_parts.append(text)
     
     def get_complete_output(self) -> str:
         """Get the complete output including any text from after tool calls"""
-        return self.final_output
+        return "".join(self.text_parts)
 
-async def run_with_iter(agent: Agent, user_input: str, message_history: Optional[List[Dict[str, Any]]] = None) -> tuple[str, List[Dict[str, Any]]]:
+def _starts_run(message: ModelMessage) -> bool:
+    """Check whether a message is the user prompt that opens an agent run"""
+    return isinstance(message, ModelRequest) and any(isinstance(part, UserPromptPart) for part in message.parts)
+
+def trim_history(messages: List[ModelMessage]) -> None:
+    """Bound the message history in place without disturbing its prefix
+    
+    Instead of sliding a window over the tail, the history grows until it holds more than
+    HISTORY_ANCHOR + HISTORY_RECENT + HISTORY_BUFFER messages and then whole blocks of
+    HISTORY_BUFFER are dropped right after the anchor. The prefix sent to the provider only
+    changes when a block is dropped, so its prompt cache keeps hitting between drops. The
+    dropped block is extended to the next user prompt so tool calls and returns stay paired,
+    but never past the start of the most recent run, which is always kept whole.
+    """
+    excess = len(messages) - HISTORY_ANCHOR - HISTORY_RECENT - HISTORY_BUFFER
+    if excess <= 0:
+        return
+
+    # Find where the most recent run starts; with no run boundary after the anchor there
+    # is nothing that can be dropped without splitting a run
+    last_run = len(messages) - 1
+    while last_run > HISTORY_ANCHOR and not _starts_run(messages[last_run]):
+        last_run -= 1
+    if last_run <= HISTORY_ANCHOR:
+        return
+
+    drop_end = min(HISTORY_ANCHOR + -(-excess // HISTORY_BUFFER) * HISTORY_BUFFER, last_run)
+    while drop_end < last_run and not _starts_run(messages[drop_end]):
+        drop_end += 1
+    logger.info("Dropping %s messages after the first %s to bound history", drop_end - HISTORY_ANCHOR, HISTORY_ANCHOR)
+    del messages[HISTORY_ANCHOR:drop_end]
+
+async def run_with_iter(agent: Agent, user_input: str, message_history: Optional[List[ModelMessage]] = None) -> tuple[str, List[ModelMessage]]:
     """Run the agent using iter() to handle streaming with proper tool call flow
     
     This is a replacement for agent.run_stream() that properly handles the case where Claude makes a tool call
@@ -170,80 +259,84 @@ async def run_with_iter(agent: Agent, user_input: str, message_history: Optional
         tuple containing (complete_output, updated_message_history)
     """
     tracker = ToolStateTracker()
-    filtered_messages = message_history or []
+    filtered_messages = message_history if message_history is not None else []
     
-    logger.info(f"User input: {user_input}")
+    logger.info("User input: %s", user_input)
     if message_history:
-        logger.info(f"Message history contains {len(message_history)} messages")
+        logger.info("Message history contains %s messages", len(message_history))
     else:
         logger.info("No message history available for this run")
     
     print("\nAgent: ", end="", flush=True)
     
     try:
+        # Bind the node checks and hot-loop helpers to locals once
+        is_model_request_node = agent.is_model_request_node
+        is_call_tools_node = agent.is_call_tools_node
+        is_end_node = agent.is_end_node
+        text_part, tool_call_part = TextPart, ToolCallPart
+        add_text = tracker.add_text
+        add_tool_call = tracker.add_tool_call
+        raw_args_ = raw_args
+        
         # Use the iter() method to manually process the agent's execution graph
         async with agent.iter(user_input, message_history=filtered_messages) as agent_run:
             async for node in agent_run:
                 # Handle different node types
-                if agent.is_model_request_node(node):
+                if is_model_request_node(node):
                     # This is a request being sent to the model (no need to do anything)
                     pass
                 
-                elif agent.is_call_tools_node(node):
+                elif is_call_tools_node(node):
                     # This is a response from the model that might contain tool calls or text
                     model_response: ModelResponse = node.model_response
                     
                     # Process each part of the response
                     for part in model_response.parts:
-                        if isinstance(part, TextPart) and part.content.strip():
+                        if isinstance(part, text_part) and part.content.strip():
                             # Display and track text output
                             print(part.content, end="", flush=True)
-                            tracker.add_text(part.content)
+                            add_text(part.content)
                         
-                        elif isinstance(part, ToolCallPart):
+                        elif isinstance(part, tool_call_part):
                             # Process and display tool call
-                            tracker.add_tool_call(part)
+                            add_tool_call(part)
                             tool_name = part.tool_name
-                            args = part.args_as_dict() if hasattr(part, "args_as_dict") else part.args
-                            logger.info(f"Tool call: {tool_name} with args: {json.dumps(args)}")
+                            args = raw_args_(part)
+                            logger.info("Tool call: %s with args: %s", tool_name, args)
                             
                             # Format the args for prettier display
-                            args_str = json.dumps(args, indent=2)
+                            args_str = pretty_args(args)
                             print(f"\n[Tool Call: {tool_name}]\n{args_str}\n", end="", flush=True)
                 
-                elif agent.is_end_node(node):
+                elif is_end_node(node):
                     # End of the execution - we can retrieve the final result
-                    logger.info(f"End node reached with result: {agent_run.result}")
+                    logger.info("End node reached with result: %s", agent_run.result)
                 
                 # For other node types, we just let them process normally
         
         # After the execution completes, get the final output
         complete_output = tracker.get_complete_output()
-        logger.info(f"Complete output collected, length: {len(complete_output)}")
-        
-        # Update message history
-        filtered_messages.append({"role": "user", "content": user_input})
-        filtered_messages.append({"role": "assistant", "content": complete_output})
+        logger.info("Complete output collected, length: %s", len(complete_output))
         
-        # Keep message history limited to last 10 messages
-        if len(filtered_messages) > 10:
-            filtered_messages = filtered_messages[-10:]
+        # Update message history with this run's messages, keeping the prefix stable
+        filtered_messages.extend(agent_run.result.new_messages())
+        trim_history(filtered_messages)
         
         return complete_output, filtered_messages
     
     except Exception as e:
-        logger.error(f"Error in run_with_iter: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in run_with_iter")
         print(f"\n\nError: {str(e)}")
         return f"Error: {str(e)}", filtered_messages
 
 async def main():
     """Run the filesystem agent with improved tool call handling"""
     logger.info("=== Agent Test Script Starting ===")
-    logger.info(f"Python version: {os.sys.version}")
-    logger.info(f"Current working directory: {os.getcwd()}")
-    logger.info(f"OPENAI_API_KEY set: {'Yes' if OPENAI_API_KEY else 'No'}")
-    logger.info(f"OPENROUTER_API_KEY set: {'Yes' if OPENROUTER_API_KEY else 'No'}")
+    logger.info("Python version: %s", os.sys.version)
+    logger.info("Current working directory: %s", os.getcwd())
+    logger.info("OPENAI_API_KEY set: %s", 'Yes' if OPENAI_API_KEY else 'No')
+    logger.info("OPENROUTER_API_KEY set: %s", 'Yes' if OPENROUTER_API_KEY else 'No')
     logger.info("Running main function")
     
     try:
@@ -259,11 +352,11 @@ async def main():
         logger.info("Starting MCP servers...")
         async with agent.run_mcp_servers():
             logger.info("MCP servers started successfully")
-            message_history = []
+            message_history: List[ModelMessage] = []
             
             while True:
                 # Get user input
-                user_input = input("> ")
+                user_input = await asyncio.to_thread(input, "> ")
                 if user_input.lower() == 'exit':
                     break
                 
@@ -273,8 +366,7 @@ async def main():
                 print("\n")  # Add a newline after the response
     
     except Exception as e:
-        logger.error(f"Error in main: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in main")
         print(f"\n\nCritical Error: {str(e)}")
 
 if __name__ == "__main__":
@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 
 import os
+import asyncio
+import anyio
 import sys
+import stat
 import logging
+import queue
 import traceback
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
 from mcp.server.fastmcp import FastMCP, Context
 
+# Shared helpers; the servers run as scripts, so their directory is on sys.path
+from fs_utils import (
+    LIST_CACHE, INFO_CACHE, cache_get, cache_put, cache_invalidate, read_text, write_text,
+    log_level_from_env
+)
+
 # Define Pydantic models for requests and responses
 class ListFilesRequest(BaseModel):
     directory: Optional[str] = Field(
@@ -64,129 +76,176 @@ async def filesystem_lifespan(server: FastMCP):
     
     log_file = log_path / "filesystem_mcp.log"
     
-    # Configure logging
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler(sys.stderr)
-        ]
-    )
+    # Configure logging. Records go through a queue to a background listener thread
+    # that owns the file and stderr handlers, so tool calls never block on log I/O
+    log_queue = queue.Queue(-1)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(log_file),
+        logging.StreamHandler(sys.stderr)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    listener = QueueListener(log_queue, *handlers)
+    listener.start()
+    
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    
+    # FastMCP already configured the root logger when it was constructed, so
+    # basicConfig would be a no-op; attach the handler and level to our own
+    # logger and keep its records out of the root handlers
     logger = logging.getLogger("filesystem_mcp")
+    logger.setLevel(log_level_from_env())  # Set LOG_LEVEL=DEBUG for verbose logs
+    logger.addHandler(queue_handler)
+    logger.propagate = False
     
     # Log startup information
     logger.info("=== Filesystem MCP Server Starting ===")
-    logger.info(f"Python version: {sys.version}")
-    logger.info(f"Log file: {log_file}")
-    logger.info(f"Current working directory: {os.getcwd()}")
+    logger.info("Python version: %s", sys.version)
+    logger.info("Log file: %s", log_file)
+    logger.info("Current working directory: %s", os.getcwd())
+    
+    # Dedicated thread pool for the tools' blocking filesystem calls, sized for I/O
+    # concurrency rather than shared with the event loop's default executor
+    executor = ThreadPoolExecutor(
+        max_workers=int(os.environ.get("FS_IO_WORKERS", "16")),
+        thread_name_prefix="fs-io"
+    )
     
     try:
-        # Yield the logger so it can be used in tool functions
-        yield {"logger": logger}
+        # Yield the logger and executor so they can be used in tool functions
+        yield {"logger": logger, "executor": executor}
     finally:
         logger.info("=== Filesystem MCP Server Shutting Down ===")
+        executor.shutdown(wait=True)
+        logger.removeHandler(queue_handler)
+        listener.stop()
 
 # Create FastMCP server with lifespan
 mcp = FastMCP("Filesystem Server", lifespan=filesystem_lifespan)
 
-@mcp.tool()
-def list_files(request: ListFilesRequest, ctx: Context) -> ListFilesResponse:
-    """List files and directories in the specified directory"""
-    logger = ctx.lifespan_context["logger"]
-    logger.info(f"Listing files in: {request.directory}")
+# Success responses are built with model_construct: their fields come straight from os
+# calls, so there is nothing for validation to catch. Error responses are still validated.
+
+def _list_files_sync(request: ListFilesRequest, logger: logging.Logger) -> ListFilesResponse:
+    """List files and directories in the specified directory (blocking)"""
+    logger.info("Listing files in: %s", request.directory)
+    abs_path = os.path.abspath(request.directory)
     
     try:
-        path = Path(request.directory)
-        if not path.exists():
-            logger.warning(f"Directory not found: {request.directory}")
+        try:
+            dir_mtime = os.stat(abs_path).st_mtime_ns
+        except FileNotFoundError:
+            logger.warning("Directory not found: %s", request.directory)
             return ListFilesResponse(
                 files=[],
                 directories=[],
-                path=str(path),
+                path=abs_path,
                 error=f"Directory '{request.directory}' not found"
             )
+        
+        cached = cache_get(LIST_CACHE, abs_path, dir_mtime)
+        if cached is not None:
+            logger.info("Using cached listing for %s", request.directory)
+            return cached
             
-        items = list(path.iterdir())
-        files = [item.name for item in items if item.is_file()]
-        directories = [item.name for item in items if item.is_dir()]
+        # DirEntry reuses the file type from the directory listing, so most entries
+        # need no extra stat call
+        files = []
+        directories = []
+        with os.scandir(abs_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    files.append(entry.name)
+                elif entry.is_dir():
+                    directories.append(entry.name)
         
-        logger.info(f"Found {len(files)} files and {len(directories)} directories in {request.directory}")
+        logger.info("Found %s files and %s directories in %s", len(files), len(directories), request.directory)
         
-        return ListFilesResponse(
+        response = ListFilesResponse.model_construct(
             files=files,
             directories=directories,
-            path=str(path.absolute())
+            path=abs_path
+        )
+        cache_put(LIST_CACHE, abs_path, response, dir_mtime)
+        return response
+    except PermissionError:
+        logger.warning("Permission denied: %s", request.directory)
+        return ListFilesResponse(
+            files=[],
+            directories=[],
+            path=abs_path,
+            error=f"Permission denied for directory '{request.directory}'"
         )
     except Exception as e:
-        logger.error(f"Error listing files: {str(e)}")
+        logger.error("Error listing files: %s", e)
         traceback.print_exc()
         return ListFilesResponse(
             files=[],
             directories=[],
-            path=str(Path(request.directory)),
+            path=abs_path,
             error=str(e)
         )
 
-@mcp.tool()
-def read_file(request: ReadFileRequest, ctx: Context) -> ReadFileResponse:
-    """Read the contents of a file"""
-    logger = ctx.lifespan_context["logger"]
-    logger.info(f"Reading file: {request.file_path}")
+def _read_file_sync(request: ReadFileRequest, logger: logging.Logger) -> ReadFileResponse:
+    """Read the contents of a file (blocking)"""
+    logger.info("Reading file: %s", request.file_path)
+    abs_path = os.path.abspath(request.file_path)
     
     try:
-        path = Path(request.file_path)
-        if not path.exists():
-            logger.warning(f"File not found: {request.file_path}")
+        # One stat call answers existence, type and size
+        try:
+            st = os.stat(abs_path)
+        except FileNotFoundError:
+            logger.warning("File not found: %s", request.file_path)
             return ReadFileResponse(
                 error=f"File '{request.file_path}' not found"
             )
             
-        if not path.is_file():
-            logger.warning(f"Not a file: {request.file_path}")
+        if not stat.S_ISREG(st.st_mode):
+            logger.warning("Not a file: %s", request.file_path)
             return ReadFileResponse(
                 error=f"'{request.file_path}' is not a file"
             )
             
-        content = path.read_text()
-        logger.info(f"Successfully read {len(content)} bytes from {request.file_path}")
+        content = read_text(abs_path, st.st_size)
+        logger.info("Successfully read %s bytes from %s", len(content), request.file_path)
         
-        return ReadFileResponse(
+        return ReadFileResponse.model_construct(
             content=content,
-            size=path.stat().st_size,
-            path=str(path.absolute())
+            size=st.st_size,
+            path=abs_path
+        )
+    except PermissionError:
+        logger.warning("Permission denied: %s", request.file_path)
+        return ReadFileResponse(
+            error=f"Permission denied for file '{request.file_path}'"
         )
     except Exception as e:
-        logger.error(f"Error reading file: {str(e)}")
+        logger.error("Error reading file: %s", e)
         traceback.print_exc()
         return ReadFileResponse(
             error=str(e)
         )
 
-@mcp.tool()
-def write_file(request: WriteFileRequest, ctx: Context) -> WriteFileResponse:
-    """Write content to a file"""
-    logger = ctx.lifespan_context["logger"]
-    logger.info(f"Writing to file: {request.file_path}")
+def _write_file_sync(request: WriteFileRequest, logger: logging.Logger) -> WriteFileResponse:
+    """Write content to a file (blocking)"""
+    logger.info("Writing to file: %s", request.file_path)
+    abs_path = os.path.abspath(request.file_path)
     
     try:
-        path = Path(request.file_path)
+        write_text(abs_path, request.content, logger)
+        cache_invalidate(abs_path)
+        logger.info("Successfully wrote %s bytes to %s", len(request.content), request.file_path)
         
-        # Create parent directories if they don't exist
-        if not path.parent.exists():
-            logger.info(f"Creating parent directories for: {request.file_path}")
-            path.parent.mkdir(parents=True)
-        
-        path.write_text(request.content)
-        logger.info(f"Successfully wrote {len(request.content)} bytes to {request.file_path}")
-        
-        return WriteFileResponse(
+        return WriteFileResponse.model_construct(
             success=True,
             message=f"Successfully wrote {len(request.content)} bytes to {request.file_path}",
-            path=str(path.absolute())
+            path=abs_path
         )
     except Exception as e:
-        logger.error(f"Error writing file: {str(e)}")
+        logger.error("Error writing file: %s", e)
         traceback.print_exc()
         return WriteFileResponse(
             success=False,
@@ -194,40 +253,87 @@ def write_file(request: WriteFileRequest, ctx: Context) -> WriteFileResponse:
             error=str(e)
         )
 
-@mcp.tool()
-def get_file_info(request: GetFileInfoRequest, ctx: Context) -> GetFileInfoResponse:
-    """Get information about a file or directory"""
-    logger = ctx.lifespan_context["logger"]
-    logger.info(f"Getting file info: {request.file_path}")
+def _get_file_info_sync(request: GetFileInfoRequest, logger: logging.Logger) -> GetFileInfoResponse:
+    """Get information about a file or directory (blocking)"""
+    logger.info("Getting file info: %s", request.file_path)
+    abs_path = os.path.abspath(request.file_path)
+    
+    cached = cache_get(INFO_CACHE, abs_path)
+    if cached is not None:
+        logger.info("Using cached file info for %s", request.file_path)
+        return cached
     
     try:
-        path = Path(request.file_path)
-        if not path.exists():
-            logger.warning(f"File or directory not found: {request.file_path}")
+        # One stat call answers existence, type, size and mtime
+        try:
+            st = os.stat(abs_path)
+        except FileNotFoundError:
+            logger.warning("File or directory not found: %s", request.file_path)
             return GetFileInfoResponse(
                 error=f"File or directory '{request.file_path}' not found"
             )
             
-        stat = path.stat()
-        logger.info(f"Successfully got file info for {request.file_path}")
+        logger.info("Successfully got file info for %s", request.file_path)
         
+        response = GetFileInfoResponse.model_construct(
+            name=os.path.basename(abs_path),
+            size=st.st_size,
+            modified=st.st_mtime,
+            is_file=stat.S_ISREG(st.st_mode),
+            is_dir=stat.S_ISDIR(st.st_mode),
+            path=abs_path
+        )
+        cache_put(INFO_CACHE, abs_path, response)
+        return response
+    except PermissionError:
+        logger.warning("Permission denied: %s", request.file_path)
         return GetFileInfoResponse(
-            name=path.name,
-            size=stat.st_size,
-            modified=stat.st_mtime,
-            is_file=path.is_file(),
-            is_dir=path.is_dir(),
-            path=str(path.absolute())
+            error=f"Permission denied for '{request.file_path}'"
         )
     except Exception as e:
-        logger.error(f"Error getting file info: {str(e)}")
+        logger.error("Error getting file info: %s", e)
         traceback.print_exc()
         return GetFileInfoResponse(
             error=str(e)
         )
 
+# The tools are async so the event loop keeps serving other requests; each one runs its
+# blocking filesystem work with a single hop to the lifespan's I/O thread pool
+async def _run_in_executor(ctx: Context, func: Callable[[Any, logging.Logger], Any], request: BaseModel) -> Any:
+    """Run a blocking tool body in the filesystem thread pool"""
+    lifespan_context = ctx.lifespan_context
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(lifespan_context["executor"], func, request, lifespan_context["logger"])
+
+@mcp.tool()
+async def list_files(request: ListFilesRequest, ctx: Context) -> ListFilesResponse:
+    """List files and directories in the specified directory"""
+    return await _run_in_executor(ctx, _list_files_sync, request)
+
+@mcp.tool()
+async def read_file(request: ReadFileRequest, ctx: Context) -> ReadFileResponse:
+    """Read the contents of a file"""
+    return await _run_in_executor(ctx, _read_file_sync, request)
+
+@mcp.tool()
+async def write_file(request: WriteFileRequest, ctx: Context) -> WriteFileResponse:
+    """Write content to a file"""
+    return await _run_in_executor(ctx, _write_file_sync, request)
+
+@mcp.tool()
+async def get_file_info(request: GetFileInfoRequest, ctx: Context) -> GetFileInfoResponse:
+    """Get information about a file or directory"""
+    return await _run_in_executor(ctx, _get_file_info_sync, request)
+
 def main():
-    mcp.run()
+    # Use uvloop's faster event loop when it's installed, by asking anyio (which FastMCP
+    # runs on) for it rather than through the deprecated uvloop.install() policy
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        mcp.run()
+        return
+    anyio.run(mcp.run_stdio_async, backend_options={"use_uvloop": True})
     
 if __name__ == "__main__":
     main()
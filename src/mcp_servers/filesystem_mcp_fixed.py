@@ -2,11 +2,36 @@
 
 import json
 import sys
+import stat
 import os
 import logging
+import queue
 import traceback
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Tuple, Type
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from pydantic import BaseModel, Field, ValidationError
+
+# Shared helpers; the servers run as scripts, so their directory is on sys.path
+from fs_utils import (
+    LIST_CACHE, INFO_CACHE, cache_get, cache_put, cache_invalidate, read_text, write_text,
+    log_level_from_env
+)
+
+# Prefer orjson for the request/response loop when it's installed; both variants produce
+# bytes, and orjson.JSONDecodeError subclasses json.JSONDecodeError
+try:
+    import orjson
+
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    loads = json.loads
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
 
 # Set up logging
 def setup_logging():
@@ -17,133 +42,175 @@ def setup_logging():
     
     log_file = log_path / "filesystem_mcp.log"
     
-    # Configure logging
+    # Configure logging. Records go through a queue to a background listener thread
+    # that owns the file and stderr handlers, so tool calls never block on log I/O
+    log_queue = queue.Queue(-1)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(log_file),
+        logging.StreamHandler(sys.stderr)  # Log errors to stderr
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    listener = QueueListener(log_queue, *handlers)
+    listener.start()
+    
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
     logging.basicConfig(
-        level=logging.DEBUG,  # Increased to DEBUG for more verbose logs
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler(sys.stderr)  # Log errors to stderr
-        ]
+        level=log_level_from_env(),  # Set LOG_LEVEL=DEBUG for verbose logs
+        handlers=[queue_handler]
     )
     logger = logging.getLogger("filesystem_mcp")
     
     # Log startup information
     logger.info("=== Filesystem MCP Server Starting ===")
-    logger.info(f"Python version: {sys.version}")
-    logger.info(f"Log file: {log_file}")
-    logger.info(f"Current working directory: {os.getcwd()}")
+    logger.info("Python version: %s", sys.version)
+    logger.info("Log file: %s", log_file)
+    logger.info("Current working directory: %s", os.getcwd())
     
-    return logger
+    return logger, listener
 
 # Initialize logging
-logger = setup_logging()
+logger, log_listener = setup_logging()
 
 # Tool implementations
 def list_files(directory: str = ".") -> Dict[str, Any]:
     """List files and directories in the specified directory"""
-    logger.info(f"Listing files in: {directory}")
+    logger.info("Listing files in: %s", directory)
+    abs_path = os.path.abspath(directory)
     try:
-        path = Path(directory)
-        if not path.exists():
-            logger.warning(f"Directory not found: {directory}")
+        try:
+            dir_mtime = os.stat(abs_path).st_mtime_ns
+        except FileNotFoundError:
+            logger.warning("Directory not found: %s", directory)
             return {"error": f"Directory '{directory}' not found"}
+        
+        cached = cache_get(LIST_CACHE, abs_path, dir_mtime)
+        if cached is not None:
+            logger.info("Using cached listing for %s", directory)
+            return cached
             
-        items = list(path.iterdir())
-        files = [item.name for item in items if item.is_file()]
-        directories = [item.name for item in items if item.is_dir()]
+        # DirEntry reuses the file type from the directory listing, so most entries
+        # need no extra stat call
+        files = []
+        directories = []
+        with os.scandir(abs_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    files.append(entry.name)
+                elif entry.is_dir():
+                    directories.append(entry.name)
         
-        logger.info(f"Found {len(files)} files and {len(directories)} directories in {directory}")
+        logger.info("Found %s files and %s directories in %s", len(files), len(directories), directory)
         
-        return {
+        result = {
             "files": files,
             "directories": directories,
-            "path": str(path.absolute())
+            "path": abs_path
         }
+        cache_put(LIST_CACHE, abs_path, result, dir_mtime)
+        return result
+    except PermissionError:
+        logger.warning("Permission denied: %s", directory)
+        return {"error": f"Permission denied for directory '{directory}'"}
     except Exception as e:
-        logger.error(f"Error listing files: {str(e)}")
+        logger.error("Error listing files: %s", e)
         traceback.print_exc()
         return {"error": str(e)}
 
 def read_file(file_path: str) -> Dict[str, Any]:
     """Read the contents of a file"""
-    logger.info(f"Reading file: {file_path}")
+    logger.info("Reading file: %s", file_path)
+    abs_path = os.path.abspath(file_path)
     try:
-        path = Path(file_path)
-        if not path.exists():
-            logger.warning(f"File not found: {file_path}")
+        # One stat call answers existence, type and size
+        try:
+            st = os.stat(abs_path)
+        except FileNotFoundError:
+            logger.warning("File not found: %s", file_path)
             return {"error": f"File '{file_path}' not found"}
             
-        if not path.is_file():
-            logger.warning(f"Not a file: {file_path}")
+        if not stat.S_ISREG(st.st_mode):
+            logger.warning("Not a file: %s", file_path)
             return {"error": f"'{file_path}' is not a file"}
             
-        content = path.read_text()
-        logger.info(f"Successfully read {len(content)} bytes from {file_path}")
+        content = read_text(abs_path, st.st_size)
+        logger.info("Successfully read %s bytes from %s", len(content), file_path)
         
         return {
             "content": content,
-            "size": path.stat().st_size,
-            "path": str(path.absolute())
+            "size": st.st_size,
+            "path": abs_path
         }
+    except PermissionError:
+        logger.warning("Permission denied: %s", file_path)
+        return {"error": f"Permission denied for file '{file_path}'"}
     except Exception as e:
-        logger.error(f"Error reading file: {str(e)}")
+        logger.error("Error reading file: %s", e)
         traceback.print_exc()
         return {"error": str(e)}
 
 def write_file(file_path: str, content: str) -> Dict[str, Any]:
     """Write content to a file"""
-    logger.info(f"Writing to file: {file_path}")
+    logger.info("Writing to file: %s", file_path)
+    abs_path = os.path.abspath(file_path)
     try:
-        path = Path(file_path)
-        
-        # Create parent directories if they don't exist
-        if not path.parent.exists():
-            logger.info(f"Creating parent directories for: {file_path}")
-            path.parent.mkdir(parents=True)
-        
-        path.write_text(content)
-        logger.info(f"Successfully wrote {len(content)} bytes to {file_path}")
+        write_text(abs_path, content)
+        cache_invalidate(abs_path)
+        logger.info("Successfully wrote %s bytes to %s", len(content), file_path)
         
         return {
             "success": True,
             "message": f"Successfully wrote {len(content)} bytes to {file_path}",
-            "path": str(path.absolute())
+            "path": abs_path
         }
     except Exception as e:
-        logger.error(f"Error writing file: {str(e)}")
+        logger.error("Error writing file: %s", e)
         traceback.print_exc()
         return {"error": str(e)}
 
 def get_file_info(file_path: str) -> Dict[str, Any]:
     """Get information about a file"""
-    logger.info(f"Getting file info: {file_path}")
+    logger.info("Getting file info: %s", file_path)
+    abs_path = os.path.abspath(file_path)
+    
+    cached = cache_get(INFO_CACHE, abs_path)
+    if cached is not None:
+        logger.info("Using cached file info for %s", file_path)
+        return cached
+    
     try:
-        path = Path(file_path)
-        if not path.exists():
-            logger.warning(f"File not found: {file_path}")
+        # One stat call answers existence, type, size and mtime
+        try:
+            st = os.stat(abs_path)
+        except FileNotFoundError:
+            logger.warning("File not found: %s", file_path)
             return {"error": f"File '{file_path}' not found"}
             
-        stat = path.stat()
-        logger.info(f"Successfully got file info for {file_path}")
+        logger.info("Successfully got file info for %s", file_path)
         
-        return {
-            "name": path.name,
-            "size": stat.st_size,
-            "modified": stat.st_mtime,
-            "is_file": path.is_file(),
-            "is_dir": path.is_dir(),
-            "path": str(path.absolute())
+        result = {
+            "name": os.path.basename(abs_path),
+            "size": st.st_size,
+            "modified": st.st_mtime,
+            "is_file": stat.S_ISREG(st.st_mode),
+            "is_dir": stat.S_ISDIR(st.st_mode),
+            "path": abs_path
         }
+        cache_put(INFO_CACHE, abs_path, result)
+        return result
+    except PermissionError:
+        logger.warning("Permission denied: %s", file_path)
+        return {"error": f"Permission denied for '{file_path}'"}
     except Exception as e:
-        logger.error(f"Error getting file info: {str(e)}")
+        logger.error("Error getting file info: %s", e)
         traceback.print_exc()
         return {"error": str(e)}
 
 # Tool specifications
-def get_tool_specs() -> List[Dict[str, Any]]:
-    """Get specifications for all available tools"""
-    logger.info("Getting tool specifications")
+def _build_tool_specs() -> List[Dict[str, Any]]:
+    """Build specifications for all available tools"""
     return [
         {
             "name": "list_files",
@@ -191,112 +258,179 @@ def get_tool_specs() -> List[Dict[str, Any]]:
         }
     ]
 
+# The specs are static, so build them once; they are only sent as part of _INIT_RESPONSE
+_TOOL_SPECS = _build_tool_specs()
+
+# The initialize response never changes, so encode it once; process_line sends these
+# bytes whenever handle_request returns this exact dict
+_INIT_RESPONSE: Dict[str, Any] = {
+    "schema_version": "v1",
+    "capabilities": ["function_calling"],
+    "tool_specs": _TOOL_SPECS
+}
+_INIT_RESPONSE_LINE = dumps(_INIT_RESPONSE) + b"\n"
+
+# Parameter models for execute_function, mirroring the request models in filesystem_mcp.py
+class ListFilesParams(BaseModel):
+    directory: str = Field(default=".", description="Directory path to list (default: current directory)")
+
+class ReadFileParams(BaseModel):
+    file_path: str = Field(..., description="Path to the file to read")
+
+class WriteFileParams(BaseModel):
+    file_path: str = Field(..., description="Path to the file to write")
+    content: str = Field(..., description="Content to write to the file")
+
+class GetFileInfoParams(BaseModel):
+    file_path: str = Field(..., description="Path to the file or directory")
+
+# Dispatch table for execute_function
+_TOOLS: Dict[str, Tuple[Callable[..., Dict[str, Any]], Type[BaseModel]]] = {
+    "list_files": (list_files, ListFilesParams),
+    "read_file": (read_file, ReadFileParams),
+    "write_file": (write_file, WriteFileParams),
+    "get_file_info": (get_file_info, GetFileInfoParams),
+}
+
+# Maximum number of bytes taken from stdin per read
+READ_SIZE = 65536
+
+# Responses go straight to the stdout file descriptor, bypassing sys.stdout's buffering
+STDOUT_FD = 1
+
+def write_stdout(data: bytes) -> None:
+    """Write bytes to stdout with as few write calls as possible"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(STDOUT_FD, view):]
+
 # Request handling
 def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
     """Handle incoming MCP requests"""
     method = request.get("method")
-    logger.info(f"Handling request with method: {method}")
+    logger.info("Handling request with method: %s", method)
     
     if method == "initialize":
         # Return capabilities and tool specs
         logger.info("Processing initialize request")
-        response = {
-            "schema_version": "v1",
-            "capabilities": ["function_calling"],
-            "tool_specs": get_tool_specs()
-        }
-        logger.info("Initialize response prepared")
-        return response
+        return _INIT_RESPONSE
     
     elif method == "execute_function":
         # Execute the requested function and return result
         function_name = request.get("function_name")
         params = request.get("parameters", {})
         
-        logger.info(f"Executing function: {function_name} with params: {params}")
+        logger.info("Executing function: %s with params: %s", function_name, params)
+        
+        tool = _TOOLS.get(function_name)
+        if tool is None:
+            logger.warning("Unknown function: %s", function_name)
+            return {"error": f"Unknown function: {function_name}"}
+        function, params_model = tool
+        
+        # The parameters were already parsed with the rest of the request line, so
+        # validate the dict in place rather than re-encoding it for model_validate_json
+        try:
+            validated = params_model.model_validate(params)
+        except ValidationError as e:
+            logger.warning("Invalid parameters for %s: %s", function_name, e)
+            return {"error": f"Invalid parameters for {function_name}: {e}"}
         
         try:
-            if function_name == "list_files":
-                result = list_files(**params)
-                return {"result": result}
-            elif function_name == "read_file":
-                result = read_file(**params)
-                return {"result": result}
-            elif function_name == "write_file":
-                result = write_file(**params)
-                return {"result": result}
-            elif function_name == "get_file_info":
-                result = get_file_info(**params)
-                return {"result": result}
-            else:
-                logger.warning(f"Unknown function: {function_name}")
-                return {"error": f"Unknown function: {function_name}"}
+            return {"result": function(**dict(validated))}
         except Exception as e:
-            logger.error(f"Error executing function {function_name}: {str(e)}")
+            logger.error("Error executing function %s: %s", function_name, e)
             traceback.print_exc()
             return {"error": str(e)}
     else:
-        logger.warning(f"Unknown method: {method}")
+        logger.warning("Unknown method: %s", method)
         return {"error": f"Unknown method: {method}"}
 
+def process_line(line: bytes) -> bytes:
+    """Handle one request line and return the encoded response line"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received input line: %s", line.strip())
+    
+    try:
+        # Parse the JSON request
+        request = loads(line)
+        
+        # Handle the request
+        response = handle_request(request)
+        if response is _INIT_RESPONSE:
+            return _INIT_RESPONSE_LINE
+        
+        # Encode the response
+        response_json = dumps(response)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending response: %s", response_json.decode())
+        return response_json + b"\n"
+        
+    except json.JSONDecodeError as e:
+        # Handle JSON parsing errors
+        logger.error("Error decoding JSON: %s", e)
+        logger.error("Line content: %s", line.strip())
+        return dumps({"error": f"Invalid JSON: {str(e)}"}) + b"\n"
+        
+    except Exception as e:
+        # Handle other errors
+        logger.error("Unexpected error: %s", e)
+        traceback.print_exc()
+        return dumps({"error": f"Server error: {str(e)}"}) + b"\n"
+
 def main():
     """Main MCP server loop"""
     logger.info("Filesystem MCP Server main loop starting")
     
     # Log where stdin/stdout are pointing
-    logger.info(f"stdin isatty: {sys.stdin.isatty()}")
-    logger.info(f"stdout isatty: {sys.stdout.isatty()}")
+    logger.info("stdin isatty: %s", sys.stdin.isatty())
+    logger.info("stdout isatty: %s", sys.stdout.isatty())
+    
+    stdin = sys.stdin.buffer
+    # Unanswered input, and how far into it has already been searched for a newline,
+    # so a request split over many reads is scanned and buffered in linear time
+    buf = bytearray()
+    scan = 0
     
     try:
         while True:
-            # Read a line from stdin
-            logger.debug("Waiting for input line...")
-            line = sys.stdin.readline()
+            # Read whatever input is available, which may hold several requests
+            logger.debug("Waiting for input...")
+            chunk = stdin.read1(READ_SIZE)
             
-            # Exit if stdin is closed
-            if not line:
+            # Exit if stdin is closed, answering a final unterminated line first
+            if not chunk:
+                if buf:
+                    write_stdout(process_line(bytes(buf)))
                 logger.info("End of input stream, shutting down")
                 break
-                
-            logger.debug(f"Received input line: {line.strip()}")
             
-            try:
-                # Parse the JSON request
-                request = json.loads(line)
-                
-                # Handle the request
-                response = handle_request(request)
-                
-                # Send the response
-                response_json = json.dumps(response)
-                logger.debug(f"Sending response: {response_json}")
-                print(response_json)
-                sys.stdout.flush()
-                logger.debug("Response sent and flushed")
-                
-            except json.JSONDecodeError as e:
-                # Handle JSON parsing errors
-                logger.error(f"Error decoding JSON: {str(e)}")
-                logger.error(f"Line content: {line.strip()}")
-                error_response = json.dumps({"error": f"Invalid JSON: {str(e)}"})
-                print(error_response)
-                sys.stdout.flush()
-                
-            except Exception as e:
-                # Handle other errors
-                logger.error(f"Unexpected error: {str(e)}")
-                traceback.print_exc()
-                error_response = json.dumps({"error": f"Server error: {str(e)}"})
-                print(error_response)
-                sys.stdout.flush()
+            buf += chunk
+            
+            # Answer every complete line, then send all the responses in one write
+            batch = bytearray()
+            count = 0
+            start = 0
+            while (nl := buf.find(b"\n", scan)) != -1:
+                batch += process_line(bytes(buf[start:nl]))
+                start = scan = nl + 1
+                count += 1
+            del buf[:start]
+            scan = len(buf)
+            if not count:
+                continue
+            
+            write_stdout(batch)
+            logger.debug("Sent %s responses", count)
     
     except KeyboardInterrupt:
         logger.info("Server interrupted")
     except Exception as e:
-        logger.error(f"Error in main loop: {str(e)}")
+        logger.error("Error in main loop: %s", e)
         traceback.print_exc()
     finally:
         logger.info("Filesystem MCP Server shutting down")
+        log_listener.stop()
 
 # Make the script executable
 if __name__ == "__main__":
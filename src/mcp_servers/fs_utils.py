@@ -0,0 +1,90 @@
+"""Log level, result cache and file I/O helpers shared by the filesystem MCP servers"""
+
+import os
+import logging
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+
+# Used when a caller doesn't pass its own logger; both servers log under this name
+_logger = logging.getLogger("filesystem_mcp")
+
+def log_level_from_env() -> int:
+    """Get the level named by LOG_LEVEL, falling back to WARNING if it isn't a level name"""
+    name = os.environ.get("LOG_LEVEL", "WARNING").upper()
+    level = logging.getLevelNamesMapping().get(name)
+    if level is None:
+        _logger.warning("Ignoring invalid LOG_LEVEL %r, using WARNING", name)
+        return logging.WARNING
+    return level
+
+# Short-lived cache for list_files and get_file_info results, keyed by absolute path.
+# Directory listings are also checked against the directory's mtime, which changes
+# whenever an entry is added or removed. Set FS_CACHE_TTL=0 to disable.
+try:
+    CACHE_TTL = float(os.environ.get("FS_CACHE_TTL", "1.0"))  # seconds
+except ValueError:
+    _logger.warning("Ignoring invalid FS_CACHE_TTL %r, using 1.0", os.environ["FS_CACHE_TTL"])
+    CACHE_TTL = 1.0
+CACHE_MAX_ENTRIES = 1024
+LIST_CACHE: Dict[str, Tuple[float, Optional[int], Any]] = {}
+INFO_CACHE: Dict[str, Tuple[float, Optional[int], Any]] = {}
+_cache_lock = threading.Lock()
+
+def cache_get(cache: Dict[str, Tuple[float, Optional[int], Any]], key: str, stamp: Optional[int] = None) -> Any:
+    """Get a cached result if it is younger than CACHE_TTL and was stored with the same stamp"""
+    hit = cache.get(key)
+    if hit is not None and hit[1] == stamp and time.monotonic() - hit[0] < CACHE_TTL:
+        return hit[2]
+    return None
+
+def cache_put(cache: Dict[str, Tuple[float, Optional[int], Any]], key: str, value: Any, stamp: Optional[int] = None) -> None:
+    """Store a result, evicting the oldest entry when the cache is full"""
+    if CACHE_TTL <= 0:
+        return
+    with _cache_lock:
+        if key not in cache and len(cache) >= CACHE_MAX_ENTRIES:
+            del cache[next(iter(cache))]
+        cache[key] = (time.monotonic(), stamp, value)
+
+def cache_invalidate(path: str) -> None:
+    """Forget cached results for a path and its parent directory's listing"""
+    with _cache_lock:
+        INFO_CACHE.pop(path, None)
+        LIST_CACHE.pop(os.path.dirname(path), None)
+
+def read_text(path: str, size: int) -> str:
+    """Read a whole file as UTF-8 text, sizing the reads from its stat size"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # Ask for one byte more than the stat size, then keep reading until os.read
+        # reports EOF: a short read is not EOF (a single read is capped near 2 GiB, and
+        # network or FUSE filesystems may return less), and a full one means it grew
+        data = os.read(fd, size + 1)
+        chunks = [data]
+        got = len(data)
+        while chunk := os.read(fd, max(size + 1 - got, 65536)):
+            chunks.append(chunk)
+            got += len(chunk)
+        if len(chunks) > 1:
+            data = b"".join(chunks)
+    finally:
+        os.close(fd)
+    return data.decode("utf-8")
+
+def write_text(path: str, content: str, logger: Optional[logging.Logger] = None) -> None:
+    """Write text to a file as UTF-8, creating parent directories only if the open fails"""
+    data = memoryview(content.encode("utf-8"))
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    try:
+        fd = os.open(path, flags, 0o666)
+    except FileNotFoundError:
+        (logger or _logger).info("Creating parent directories for: %s", path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, flags, 0o666)
+    try:
+        # os.write may write less than asked, so loop until everything is out
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)